@@ -1,22 +1,294 @@
-import requests
 import json
-import socketio
 import sys
 import os
 import time
 import random
+import queue
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Only HardToGetClient talks to the server; the decision helpers above it
+# (used by mcp-simulator.py) work with the standard library alone
+try:
+    import requests
+    import socketio
+except ImportError:
+    requests = None
+    socketio = None
+
+def hash_dilemma_side(key_word, dilemma):
+    """
+    Placeholder Witness decision: a "random" but deterministic choice
+    based on the hash of the key word and dilemma
+    """
+    combined = key_word + dilemma[0] + dilemma[1]
+    hash_value = sum(ord(c) for c in combined)
+    return hash_value % 2
+
+def simple_similarity(word, term):
+    """Very simple string similarity - would be replaced by LLM judgment"""
+    # Count common characters
+    common_chars = set(word.lower()) & set(term.lower())
+    return len(common_chars) / max(len(set(word.lower())), len(set(term.lower())))
+
+def rank_eliminations(board, dilemma, witness_choice):
+    """Order board words from most to least similar to the option the Witness rejected"""
+    opposite_choice = dilemma[0] if dilemma[1] == witness_choice else dilemma[1]
+    
+    scored_words = [(word, simple_similarity(word, opposite_choice)) for word in board]
+    scored_words.sort(key=lambda x: x[1], reverse=True)
+    
+    return [word for word, score in scored_words]
+
+class StubBatchModel:
+    """
+    Offline stand-in for a batched LLM, built on the placeholder heuristics
+    
+    Takes a list of decision requests and returns one answer per request:
+    a dilemma side index for Witness requests and a list of words to
+    eliminate for Detective requests.
+    """
+    def __init__(self):
+        self.batch_sizes = []
+    
+    def __call__(self, requests):
+        self.batch_sizes.append(len(requests))
+        
+        answers = []
+        for req in requests:
+            if req['role'] == 'Witness':
+                answers.append(hash_dilemma_side(req['key_word'], req['dilemma']))
+            else:
+                ranked = rank_eliminations(req['board'], req['dilemma'], req['witness_choice'])
+                num_to_eliminate = min(len(ranked) - 1, random.randint(1, 3))
+                answers.append(ranked[:num_to_eliminate])
+        
+        return answers
+
+class BatchedStrategy:
+    """
+    Gathers pending turns from many games into micro-batches
+    
+    A single worker thread waits for the first request, then keeps collecting
+    until max_batch_size requests are pending or max_wait seconds have passed,
+    and calls decide_batch(requests) once for the whole batch. Answers are
+    delivered through futures resolved on a small dispatcher pool, so callbacks
+    that post to the server don't hold up the next batch.
+    
+    Share one instance between clients to batch across concurrent games.
+    """
+    def __init__(self, decide_batch, max_batch_size=32, max_wait=0.05, dispatch_workers=8):
+        self.decide_batch = decide_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.pending = queue.Queue()
+        self.lock = threading.Lock()
+        self.closed = False
+        self.dispatcher = ThreadPoolExecutor(max_workers=dispatch_workers)
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+    
+    def submit(self, request):
+        """Queue a decision request and return a Future for its answer"""
+        future = Future()
+        with self.lock:
+            if self.closed:
+                raise RuntimeError("BatchedStrategy is closed")
+            self.pending.put((request, future))
+        return future
+    
+    def decide(self, request, timeout=None):
+        """Queue a decision request and block until it is answered"""
+        return self.submit(request).result(timeout)
+    
+    def close(self):
+        """Answer what is still queued, then stop the worker"""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.pending.put(None)
+        self.worker.join()
+        self.dispatcher.shutdown(wait=True)
+    
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self.pending.get()
+            if first is None:
+                break
+            
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.pending.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            
+            self._decide(batch)
+    
+    def _decide(self, batch):
+        futures = [future for _, future in batch]
+        try:
+            answers = self.decide_batch([request for request, _ in batch])
+            if len(answers) != len(batch):
+                raise ValueError(f"decide_batch returned {len(answers)} answers for {len(batch)} requests")
+        except Exception as e:
+            for future in futures:
+                self.dispatcher.submit(future.set_exception, e)
+            return
+        
+        for future, answer in zip(futures, answers):
+            self.dispatcher.submit(future.set_result, answer)
+
+class DecisionCache:
+    """
+    Memoizes decisions for repeated (key word or board, dilemma) situations
+    
+    Lookups go to an in-memory LRU first and then to an SQLite store on disk,
+    which any number of client processes can share. Requests are the same
+    dicts handed to BatchedStrategy; the key is built from the model, role,
+    key word (Witness) or board (Detective), dilemma and Witness choice.
+    Pass enabled=False to bypass the cache, e.g. for stochastic evaluation.
+    """
+    def __init__(self, path='decision_cache.db', max_entries=10000, enabled=True):
+        self.path = path
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        
+        self.conn = None
+        if enabled and path:
+            self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS decisions (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+            ''')
+            self.conn.commit()
+    
+    @staticmethod
+    def key_for(request):
+        """Build the cache key of a decision request"""
+        if request['role'] == 'Witness':
+            subject = request['key_word']
+        else:
+            # The board's order carries no information, so share entries across orders
+            subject = sorted(request['board'])
+        
+        return json.dumps([
+            request.get('model'),
+            request['role'],
+            request.get('kind'),
+            subject,
+            list(request['dilemma']),
+            request.get('witness_choice')
+        ])
+    
+    def get(self, request):
+        """Return the cached decision for a request, or None"""
+        if not self.enabled:
+            return None
+        
+        key = self.key_for(request)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.memory_hits += 1
+                return self.entries[key]
+            
+            row = None
+            if self.conn:
+                row = self.conn.execute(
+                    'SELECT value FROM decisions WHERE key = ?', (key,)
+                ).fetchone()
+            
+            if row is None:
+                self.misses += 1
+                return None
+            
+            self.disk_hits += 1
+            value = json.loads(row[0])
+            self._remember(key, value)
+            return value
+    
+    def put(self, request, value):
+        """Store the decision made for a request"""
+        if not self.enabled:
+            return
+        
+        key = self.key_for(request)
+        with self.lock:
+            self._remember(key, value)
+            if self.conn:
+                # First writer wins so every process keeps seeing the same decision
+                self.conn.execute(
+                    'INSERT OR IGNORE INTO decisions (key, value) VALUES (?, ?)',
+                    (key, json.dumps(value))
+                )
+                self.conn.commit()
+    
+    def _remember(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+    
+    def stats(self):
+        """Return hit and miss counts plus the overall hit rate"""
+        with self.lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self.entries),
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+            }
+    
+    def close(self):
+        """Close the on-disk store"""
+        if self.conn:
+            self.conn.close()
+            self.conn = None
 
 class HardToGetClient:
-    def __init__(self, server_url, model_name):
+    def __init__(self, server_url, model_name, strategy=None, decision_cache=None,
+                 session_file=None):
         """
         Initialize a Hard to Get client
         
         Args:
             server_url (str): The URL of the MCP server
             model_name (str): The LLM model name this client is using
+            strategy (BatchedStrategy): Optional batched decision maker; when set,
+                turns are answered asynchronously instead of inside the event handler
+            decision_cache (DecisionCache): Optional cache of earlier decisions
+            session_file (str): Optional JSON file remembering the client ID per
+                server and model, so later runs resume instead of registering again
         """
         self.server_url = server_url
         self.model_name = model_name
+        self.strategy = strategy
+        self.decision_cache = decision_cache
+        self.session_file = session_file
         self.client_id = None
         self.game_id = None
         self.role = None
@@ -25,6 +297,9 @@ class HardToGetClient:
         self.key_word = None  # Only for Witness
         self.game_active = False
         
+        if requests is None or socketio is None:
+            raise ImportError("HardToGetClient needs the requests and python-socketio packages")
+        
         # Initialize socketio client
         self.sio = socketio.Client()
         self.setup_socket_handlers()
@@ -57,23 +332,64 @@ class HardToGetClient:
             self.handle_game_ended(data)
     
     def register(self):
-        """Register with the MCP server and get a client ID"""
+        """Register with the MCP server (or resume a saved session) and get a client ID"""
+        sessions = self.load_sessions()
+        session_key = f"{self.server_url} {self.model_name}"
+        
         response = requests.post(
             f"{self.server_url}/register",
-            json={"model_name": self.model_name}
+            json={
+                "model_name": self.model_name,
+                "client_id": sessions.get(session_key)
+            }
         )
         
+        if response.status_code == 409:
+            # The saved client is still in a game (e.g. an earlier run died mid-game)
+            print(f"Saved session cannot be resumed: {response.json().get('error')}")
+            response = requests.post(
+                f"{self.server_url}/register",
+                json={"model_name": self.model_name}
+            )
+        
         if response.status_code == 200:
             data = response.json()
             self.client_id = data['client_id']
-            print(f"Registered with client ID: {self.client_id}")
+            
+            if data.get('status') == 'resumed':
+                print(f"Resumed session with client ID: {self.client_id}")
+            else:
+                print(f"Registered with client ID: {self.client_id}")
+                if self.session_file:
+                    sessions[session_key] = self.client_id
+                    self.save_sessions(sessions)
+            
             return self.client_id
         else:
             print(f"Registration failed: {response.text}")
             return None
     
-    def join_game(self, preferred_role=None):
-        """Join a game with optional role preference"""
+    def load_sessions(self):
+        """Read saved client IDs, keyed by server URL and model name"""
+        if not self.session_file or not os.path.exists(self.session_file):
+            return {}
+        
+        try:
+            with open(self.session_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable session file: {e}")
+            return {}
+    
+    def save_sessions(self, sessions):
+        """Write saved client IDs atomically so concurrent runs never see a partial file"""
+        temp_file = f"{self.session_file}.{os.getpid()}.tmp"
+        with open(temp_file, 'w') as f:
+            json.dump(sessions, f, indent=2)
+        os.replace(temp_file, self.session_file)
+    
+    def join_game(self, preferred_role=None, matchmaking=None):
+        """Join a game with optional role preference and matchmaking mode ('rated')"""
         if not self.client_id:
             print("Must register before joining a game")
             return False
@@ -82,7 +398,8 @@ class HardToGetClient:
             f"{self.server_url}/join_game",
             json={
                 "client_id": self.client_id,
-                "preferred_role": preferred_role
+                "preferred_role": preferred_role,
+                "matchmaking": matchmaking
             }
         )
         
@@ -117,9 +434,47 @@ class HardToGetClient:
         print(f"You are the Witness. The key word is: {self.key_word}")
         print(f"Dilemma: {dilemma[0]} vs {dilemma[1]}")
         
+        if self.strategy:
+            decision_request = {
+                'role': 'Witness',
+                'model': self.model_name,
+                'key_word': self.key_word,
+                'dilemma': dilemma
+            }
+            choice_index = self.cached_decision(decision_request)
+            if choice_index is not None:
+                self.send_witness_decision(dilemma, choice_index)
+                return
+            
+            # Hand the decision to the batcher and return from the event handler
+            future = self.strategy.submit(decision_request)
+            future.add_done_callback(
+                lambda f: self.finish_witness_turn(decision_request, dilemma, f))
+            return
+        
         # In a real implementation, the LLM would make this decision
         # For this demo, we'll hardcode a simple algorithm
         choice_index = self.choose_dilemma_side(self.key_word, dilemma)
+        self.send_witness_decision(dilemma, choice_index)
+    
+    def finish_witness_turn(self, decision_request, dilemma, future):
+        """Send a batched Witness decision once it is available"""
+        try:
+            choice_index = future.result()
+            if choice_index not in (0, 1):
+                raise ValueError(f"invalid dilemma side {choice_index!r}")
+        except Exception as e:
+            # Never leave the game waiting on a move; decide locally instead,
+            # without caching, so the model is asked again next time
+            print(f"Batched witness decision failed, using fallback: {e}")
+            choice_index = hash_dilemma_side(decision_request['key_word'], dilemma)
+        else:
+            self.remember_decision(decision_request, choice_index)
+        
+        self.send_witness_decision(dilemma, choice_index)
+    
+    def send_witness_decision(self, dilemma, choice_index):
+        """Report and submit the chosen dilemma side"""
         choice = dilemma[choice_index]
         
         print(f"You chose: {choice}")
@@ -132,12 +487,32 @@ class HardToGetClient:
         Use a very simple algorithm to choose a dilemma side
         In a real implementation, the LLM would make this decision
         """
-        # This is a placeholder - in reality, an LLM would make this choice
-        # For simplicity, we'll make a "random" but deterministic choice
-        # based on the hash of the key word and dilemma
-        combined = key_word + dilemma[0] + dilemma[1]
-        hash_value = sum(ord(c) for c in combined)
-        return hash_value % 2
+        # Keyed apart from batched model answers so the two never mix
+        decision_request = {
+            'role': 'Witness',
+            'kind': 'heuristic',
+            'model': self.model_name,
+            'key_word': key_word,
+            'dilemma': dilemma
+        }
+        choice_index = self.cached_decision(decision_request)
+        if choice_index is None:
+            # This is a placeholder - in reality, an LLM would make this choice
+            choice_index = hash_dilemma_side(key_word, dilemma)
+            self.remember_decision(decision_request, choice_index)
+        
+        return choice_index
+    
+    def cached_decision(self, decision_request):
+        """Look up an earlier decision for the same situation, if caching is on"""
+        if self.decision_cache is None:
+            return None
+        return self.decision_cache.get(decision_request)
+    
+    def remember_decision(self, decision_request, decision):
+        """Record a decision for reuse by later games"""
+        if self.decision_cache is not None:
+            self.decision_cache.put(decision_request, decision)
     
     def submit_witness_choice(self, dilemma_choice):
         """Submit the witness's dilemma choice to the server"""
@@ -165,10 +540,53 @@ class HardToGetClient:
         print(f"The Witness chose: {witness_choice}")
         print(f"Current board: {self.board}")
         
+        if self.strategy:
+            decision_request = {
+                'role': 'Detective',
+                'model': self.model_name,
+                'board': list(self.board),
+                'dilemma': dilemma,
+                'witness_choice': witness_choice
+            }
+            eliminated = self.cached_decision(decision_request)
+            if eliminated is not None:
+                self.board = [word for word in self.board if word not in eliminated]
+                self.send_detective_decision(eliminated)
+                return
+            
+            # Hand the decision to the batcher and return from the event handler
+            future = self.strategy.submit(decision_request)
+            future.add_done_callback(
+                lambda f: self.finish_detective_turn(decision_request, f))
+            return
+        
         # In a real implementation, the LLM would make this decision
         # For this demo, we'll implement a simple algorithm
         eliminated = self.choose_eliminations(dilemma, witness_choice)
+        self.send_detective_decision(eliminated)
+    
+    def finish_detective_turn(self, decision_request, future):
+        """Apply and send a batched Detective decision once it is available"""
+        try:
+            eliminated = future.result()
+            if not eliminated or not set(eliminated) <= set(decision_request['board']):
+                raise ValueError(f"invalid eliminations {eliminated!r}")
+        except Exception as e:
+            # Never leave the game waiting on a move; decide locally instead
+            print(f"Batched detective decision failed, using fallback: {e}")
+            eliminated = self.choose_eliminations(
+                decision_request['dilemma'], decision_request['witness_choice'])
+            self.send_detective_decision(eliminated)
+            return
+        
+        self.remember_decision(decision_request, eliminated)
         
+        # Update our local board
+        self.board = [word for word in self.board if word not in eliminated]
+        self.send_detective_decision(eliminated)
+    
+    def send_detective_decision(self, eliminated):
+        """Report and submit the chosen eliminations"""
         print(f"You've chosen to eliminate: {eliminated}")
         
         # Send the eliminations to the server
@@ -182,25 +600,27 @@ class HardToGetClient:
         # This is a placeholder - in reality, an LLM would make this choice
         # For this demo, we'll eliminate 1-3 random words
         
-        # Find the opposite choice
-        opposite_choice = dilemma[0] if dilemma[1] == witness_choice else dilemma[1]
-        
         # Determine how many words to eliminate (between 1 and 3)
         num_to_eliminate = min(len(self.board) - 1, random.randint(1, 3))
         
-        # Create a simple scoring system based on word similarity to the opposite choice
-        scored_words = []
-        for word in self.board:
+        # Only the scoring pass is cached; how many words to drop stays random
+        decision_request = {
+            'role': 'Detective',
+            'kind': 'ranking',
+            'model': self.model_name,
+            'board': self.board,
+            'dilemma': dilemma,
+            'witness_choice': witness_choice
+        }
+        ranked_words = self.cached_decision(decision_request)
+        if ranked_words is None:
+            # Rank words by a simple string similarity to the opposite choice
             # In a real implementation, an LLM would determine relevance
-            # Here we'll use a simple string-based approach
-            similarity = self.simple_similarity(word, opposite_choice)
-            scored_words.append((word, similarity))
-        
-        # Sort by similarity (higher means more similar to opposite choice)
-        scored_words.sort(key=lambda x: x[1], reverse=True)
+            ranked_words = rank_eliminations(self.board, dilemma, witness_choice)
+            self.remember_decision(decision_request, ranked_words)
         
         # Choose the top N words to eliminate
-        to_eliminate = [word for word, score in scored_words[:num_to_eliminate]]
+        to_eliminate = ranked_words[:num_to_eliminate]
         
         # Update our local board
         self.board = [word for word in self.board if word not in to_eliminate]
@@ -209,6 +629,4 @@ class HardToGetClient:
     
     def simple_similarity(self, word, term):
         """Very simple string similarity - would be replaced by LLM judgment"""
-        # Count common characters
-        common_chars = set(word.lower()) & set(term.lower())
-        return len(common_chars) / max(len(set(word.lower())), len(set(term.lower())))
\ No newline at end of file
+        return simple_similarity(word, term)
\ No newline at end of file
@@ -2,10 +2,15 @@ import os
 import uuid
 import random
 import json
-from flask import Flask, request, jsonify
+import time
+import csv
+import io
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_socketio import SocketIO, emit, join_room
 import sqlite3
-from threading import Lock
+from bisect import bisect_left, insort
+from collections import OrderedDict, deque
+from threading import Lock, Condition
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -17,12 +22,25 @@ def init_db():
     conn = sqlite3.connect('hard_to_get.db')
     cursor = conn.cursor()
     
+    # Write-ahead logging lets exports read while games are being saved
+    cursor.execute('PRAGMA journal_mode=WAL')
+    
+    # Create models table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS models (
+        id INTEGER PRIMARY KEY,
+        name TEXT UNIQUE NOT NULL
+    )
+    ''')
+    
     # Create clients table
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS clients (
         uuid TEXT PRIMARY KEY,
         model_name TEXT NOT NULL,
-        status TEXT DEFAULT 'available'
+        model_id INTEGER,
+        status TEXT DEFAULT 'available',
+        FOREIGN KEY (model_id) REFERENCES models (id)
     )
     ''')
     
@@ -36,6 +54,7 @@ def init_db():
         key_word TEXT,
         current_round INTEGER DEFAULT 0,
         board TEXT,
+        created_at TEXT,
         FOREIGN KEY (witness_uuid) REFERENCES clients (uuid),
         FOREIGN KEY (detective_uuid) REFERENCES clients (uuid)
     )
@@ -46,17 +65,65 @@ def init_db():
     CREATE TABLE IF NOT EXISTS results (
         game_id TEXT PRIMARY KEY,
         witness_uuid TEXT,
-        witness_model TEXT,
+        witness_model_id INTEGER,
         detective_uuid TEXT,
-        detective_model TEXT,
+        detective_model_id INTEGER,
         result TEXT,
-        FOREIGN KEY (game_id) REFERENCES games (id)
+        completed_at TEXT,
+        FOREIGN KEY (game_id) REFERENCES games (id),
+        FOREIGN KEY (witness_model_id) REFERENCES models (id),
+        FOREIGN KEY (detective_model_id) REFERENCES models (id)
     )
     ''')
     
+    # Databases created before timestamps were recorded lack these columns
+    add_missing_column(cursor, 'games', 'created_at', 'TEXT')
+    add_missing_column(cursor, 'results', 'completed_at', 'TEXT')
+    
+    # Databases created before the models table stored free-text model names
+    if add_missing_column(cursor, 'clients', 'model_id', 'INTEGER REFERENCES models (id)'):
+        cursor.execute('INSERT OR IGNORE INTO models (name) SELECT DISTINCT model_name FROM clients')
+        cursor.execute('''
+        UPDATE clients SET model_id = (SELECT id FROM models WHERE name = clients.model_name)
+        ''')
+        
+        # Statuses were never reset after a game, so free everyone not in a live game
+        cursor.execute('''
+        UPDATE clients SET status = 'available'
+        WHERE uuid NOT IN (
+            SELECT witness_uuid FROM games
+            WHERE status IN ('pending', 'ready', 'active') AND witness_uuid IS NOT NULL
+            UNION
+            SELECT detective_uuid FROM games
+            WHERE status IN ('pending', 'ready', 'active') AND detective_uuid IS NOT NULL
+        )
+        ''')
+    
+    if add_missing_column(cursor, 'results', 'witness_model_id', 'INTEGER REFERENCES models (id)'):
+        add_missing_column(cursor, 'results', 'detective_model_id', 'INTEGER REFERENCES models (id)')
+        cursor.execute('''
+        INSERT OR IGNORE INTO models (name)
+        SELECT witness_model FROM results WHERE witness_model IS NOT NULL
+        UNION SELECT detective_model FROM results WHERE detective_model IS NOT NULL
+        ''')
+        cursor.execute('''
+        UPDATE results SET
+            witness_model_id = (SELECT id FROM models WHERE name = results.witness_model),
+            detective_model_id = (SELECT id FROM models WHERE name = results.detective_model)
+        ''')
+    
     conn.commit()
     conn.close()
 
+def add_missing_column(cursor, table, column, declaration):
+    """Add a column to an existing table unless it is already there; return True if added"""
+    cursor.execute(f'PRAGMA table_info({table})')
+    if column in [row[1] for row in cursor.fetchall()]:
+        return False
+    
+    cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {declaration}')
+    return True
+
 # Load words and dilemmas from files
 def load_words():
     if not os.path.exists('words.txt'):
@@ -130,30 +197,540 @@ def generate_dilemmas_file():
         for dilemma in all_dilemmas:
             f.write(f"{dilemma}\n")
 
+# Matchmaking settings
+MATCHMAKING_PAIR_TARGET = 3      # Games each (witness model, detective model) pair should reach
+MATCHMAKING_BUCKET_WIDTH = 0.05  # Width of a rating bucket in the ordered index
+MATCHMAKING_MAX_PROBES = 64      # Waiting games inspected before settling for the nearest rating
+RATING_PRIOR_GAMES = 4           # Pseudo-games pulling new models towards a 0.5 rating
+
+class Matchmaker:
+    """Rating-ordered index of pending games used by the 'rated' matchmaking mode"""
+    def __init__(self, pair_target=MATCHMAKING_PAIR_TARGET,
+                 bucket_width=MATCHMAKING_BUCKET_WIDTH,
+                 max_probes=MATCHMAKING_MAX_PROBES):
+        self.lock = Lock()
+        self.pair_target = pair_target
+        self.bucket_width = bucket_width
+        self.max_probes = max_probes
+        
+        # model ID -> [wins, games] and (witness model ID, detective model ID) -> games,
+        # where pair counts include games still being played
+        self.model_stats = {}
+        self.pair_counts = {}
+        self.active_pairs = {}  # game_id -> pair, for running games already counted
+        
+        # For each open role: sorted bucket keys plus bucket -> FIFO of waiting games
+        self.bucket_keys = {'Witness': [], 'Detective': []}
+        self.buckets = {'Witness': {}, 'Detective': {}}
+        self.waiting = {}  # game_id -> (open_role, bucket)
+    
+    def load_results(self, cursor):
+        """Rebuild model ratings and pair coverage from finished and running games"""
+        cursor.execute('''
+        SELECT witness_model_id, detective_model_id,
+               SUM(CASE WHEN result = 'win' THEN 1 ELSE 0 END), COUNT(*)
+        FROM results
+        GROUP BY witness_model_id, detective_model_id
+        ''')
+        finished = cursor.fetchall()
+        
+        cursor.execute('''
+        SELECT g.id, cw.model_id, cd.model_id
+        FROM games g
+        JOIN clients cw ON cw.uuid = g.witness_uuid
+        JOIN clients cd ON cd.uuid = g.detective_uuid
+        WHERE g.status IN ('ready', 'active')
+        ''')
+        running = cursor.fetchall()
+        
+        with self.lock:
+            self.model_stats = {}
+            self.pair_counts = {}
+            self.active_pairs = {}
+            for witness_model, detective_model, wins, games in finished:
+                self.pair_counts[(witness_model, detective_model)] = games
+                for model in (witness_model, detective_model):
+                    stats = self.model_stats.setdefault(model, [0, 0])
+                    stats[0] += wins
+                    stats[1] += games
+            
+            for game_id, witness_model, detective_model in running:
+                self._count_pair(game_id, witness_model, detective_model)
+    
+    def start_game(self, game_id, witness_model, detective_model):
+        """Count a game towards its pair's coverage as soon as both players are in"""
+        with self.lock:
+            self._count_pair(game_id, witness_model, detective_model)
+    
+    def _count_pair(self, game_id, witness_model, detective_model):
+        if game_id in self.active_pairs:
+            return
+        pair = (witness_model, detective_model)
+        self.active_pairs[game_id] = pair
+        self.pair_counts[pair] = self.pair_counts.get(pair, 0) + 1
+    
+    def record_result(self, game_id, witness_model, detective_model, win):
+        """Fold a finished game into the ratings and pair coverage"""
+        with self.lock:
+            pair = (witness_model, detective_model)
+            
+            # Running games were already counted when they started
+            if self.active_pairs.pop(game_id, None) is None:
+                self.pair_counts[pair] = self.pair_counts.get(pair, 0) + 1
+            
+            for model in pair:
+                stats = self.model_stats.setdefault(model, [0, 0])
+                stats[0] += 1 if win else 0
+                stats[1] += 1
+    
+    def rating(self, model):
+        """Smoothed win rate of a model, 0.5 for models without results"""
+        wins, games = self.model_stats.get(model, (0, 0))
+        return (wins + RATING_PRIOR_GAMES * 0.5) / (games + RATING_PRIOR_GAMES)
+    
+    def add(self, game_id, open_role, client_id, model):
+        """Index a pending game that still needs a player for open_role"""
+        with self.lock:
+            bucket = int(self.rating(model) / self.bucket_width)
+            entries = self.buckets[open_role].get(bucket)
+            if entries is None:
+                entries = self.buckets[open_role][bucket] = OrderedDict()
+                insort(self.bucket_keys[open_role], bucket)
+            entries[game_id] = (client_id, model)
+            self.waiting[game_id] = (open_role, bucket)
+    
+    def discard(self, game_id):
+        """Drop a game from the index, e.g. once it has been joined"""
+        with self.lock:
+            self._remove(game_id)
+    
+    def _remove(self, game_id):
+        location = self.waiting.pop(game_id, None)
+        if location is None:
+            return
+        
+        open_role, bucket = location
+        entries = self.buckets[open_role][bucket]
+        del entries[game_id]
+        if not entries:
+            del self.buckets[open_role][bucket]
+            keys = self.bucket_keys[open_role]
+            del keys[bisect_left(keys, bucket)]
+    
+    def claim(self, client_id, model, preferred_role=None):
+        """
+        Remove and return (game_id, role) of the best pending game for this client
+        
+        Candidates are visited from the nearest rating bucket outwards. The first
+        one whose model pair is still below the coverage target wins; otherwise
+        the nearest-rated candidate is used. Returns (None, None) if nothing waits.
+        """
+        roles = [preferred_role] if preferred_role in ('Witness', 'Detective') \
+            else ['Witness', 'Detective']
+        
+        with self.lock:
+            bucket = int(self.rating(model) / self.bucket_width)
+            best = None
+            
+            for role in roles:
+                candidate = self._search(role, bucket, client_id, model)
+                if candidate and (best is None or candidate[0] < best[0]):
+                    best = candidate
+            
+            if best is None:
+                return None, None
+            
+            _, game_id, role = best
+            self._remove(game_id)
+            return game_id, role
+    
+    def _search(self, role, bucket, client_id, model):
+        """Return (rank, game_id, role) of the best candidate for one open role"""
+        keys = self.bucket_keys[role]
+        if not keys:
+            return None
+        
+        # Walk outwards from the client's bucket, always taking the closer side
+        right = bisect_left(keys, bucket)
+        left = right - 1
+        probes = 0
+        fallback = None
+        
+        while probes < self.max_probes and (left >= 0 or right < len(keys)):
+            if right >= len(keys) or (left >= 0 and bucket - keys[left] <= keys[right] - bucket):
+                key = keys[left]
+                left -= 1
+            else:
+                key = keys[right]
+                right += 1
+            
+            for game_id, (waiting_client, waiting_model) in self.buckets[role][key].items():
+                if waiting_client == client_id:
+                    continue
+                
+                distance = abs(key - bucket)
+                pair = (model, waiting_model) if role == 'Witness' else (waiting_model, model)
+                if self.pair_counts.get(pair, 0) < self.pair_target:
+                    return (0, distance), game_id, role
+                if fallback is None:
+                    fallback = (1, distance), game_id, role
+                
+                probes += 1
+                if probes >= self.max_probes:
+                    break
+        
+        return fallback
+
+# Spectator settings
+SPECTATOR_TICK = 0.5          # Seconds between coalesced spectator updates
+SPECTATOR_BUFFER = 64         # Frames buffered per spectator before the oldest are dropped
+SPECTATOR_KEEPALIVE = 15      # Seconds of silence before a keep-alive comment is sent
+
+class SpectatorSubscriber:
+    """Bounded frame buffer of one spectator stream"""
+    def __init__(self, game_id=None, buffer_size=SPECTATOR_BUFFER):
+        self.game_id = game_id  # None follows every game
+        self.frames = deque(maxlen=buffer_size)
+        self.dropped = 0
+        self.condition = Condition()
+    
+    def push(self, frame):
+        """Queue a frame, dropping the oldest one if the viewer is falling behind"""
+        with self.condition:
+            if len(self.frames) == self.frames.maxlen:
+                self.dropped += 1
+            self.frames.append(frame)
+            self.condition.notify()
+    
+    def drain(self, timeout):
+        """Wait up to timeout seconds and return (frames, dropped since last drain)"""
+        with self.condition:
+            if not self.frames:
+                self.condition.wait(timeout)
+            frames = list(self.frames)
+            dropped = self.dropped
+            self.frames.clear()
+            self.dropped = 0
+            return frames, dropped
+
+class SpectatorHub:
+    """
+    Read-only fan-out of game events to spectators
+    
+    The game path only records events into a per-game pending update. A
+    background ticker merges each game's events into one frame per tick and
+    pushes it into every matching subscriber's bounded buffer, so slow viewers
+    never hold up socketio.emit for the players.
+    """
+    def __init__(self, tick=SPECTATOR_TICK, buffer_size=SPECTATOR_BUFFER):
+        self.lock = Lock()
+        self.tick = tick
+        self.buffer_size = buffer_size
+        self.pending = OrderedDict()  # game_id -> coalesced update
+        self.subscribers = set()
+        self.ticker_started = False
+    
+    def publish(self, game_id, event, payload):
+        """Record a game event for the next tick"""
+        with self.lock:
+            # Nothing to do while nobody is watching
+            if not self.subscribers:
+                return
+            
+            update = self.pending.get(game_id)
+            if update is None:
+                update = self.pending[game_id] = {'game_id': game_id, 'events': [], 'state': {}}
+            update['events'].append(event)
+            update['state'].update(payload)
+    
+    def subscribe(self, game_id=None):
+        """Register a spectator for one game, or for all games if game_id is None"""
+        subscriber = SpectatorSubscriber(game_id, self.buffer_size)
+        with self.lock:
+            self.subscribers.add(subscriber)
+            if not self.ticker_started:
+                self.ticker_started = True
+                socketio.start_background_task(self.run_ticker)
+        return subscriber
+    
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+    
+    def run_ticker(self):
+        while True:
+            socketio.sleep(self.tick)
+            self.flush()
+    
+    def flush(self):
+        """Send one coalesced frame per tick to every interested subscriber"""
+        with self.lock:
+            if not self.pending:
+                return
+            pending, self.pending = self.pending, OrderedDict()
+            subscribers = list(self.subscribers)
+        
+        tick_time = time.time()
+        updates = list(pending.values())
+        
+        for subscriber in subscribers:
+            if subscriber.game_id is None:
+                subscriber.push({'time': tick_time, 'games': updates})
+            elif subscriber.game_id in pending:
+                subscriber.push({'time': tick_time, 'games': [pending[subscriber.game_id]]})
+    
+    def stream(self, subscriber):
+        """Yield Server-Sent Events for a subscriber until the client disconnects"""
+        try:
+            while True:
+                frames, dropped = subscriber.drain(SPECTATOR_KEEPALIVE)
+                if not frames:
+                    yield ': keep-alive\n\n'
+                    continue
+                
+                # Tell the viewer how many frames it missed while falling behind
+                if dropped:
+                    frames[0] = dict(frames[0], dropped=dropped)
+                
+                for frame in frames:
+                    yield f"data: {json.dumps(frame)}\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+# Export settings
+EXPORT_PAGE_SIZE = 1000  # Rows read per keyset page
+
+# Exportable tables: columns, row query and the expressions filters apply to.
+# Client UUIDs are never exported: they are the only credential a player has,
+# and a client keeps its UUID across games.
+EXPORT_TABLES = {
+    'results': {
+        'columns': ['cursor', 'game_id', 'witness_model', 'detective_model',
+                    'result', 'completed_at'],
+        'query': '''
+        SELECT r.rowid, r.game_id, mw.name, md.name, r.result, r.completed_at
+        FROM results r
+        LEFT JOIN models mw ON mw.id = r.witness_model_id
+        LEFT JOIN models md ON md.id = r.detective_model_id
+        ''',
+        'rowid': 'r.rowid',
+        'witness_model': 'mw.name',
+        'detective_model': 'md.name',
+        'time': 'r.completed_at'
+    },
+    'games': {
+        'columns': ['cursor', 'game_id', 'witness_model', 'detective_model',
+                    'status', 'key_word', 'current_round', 'board', 'created_at'],
+        # Key words of unfinished games are not exported
+        'query': '''
+        SELECT g.rowid, g.id, mw.name, md.name, g.status,
+               CASE WHEN g.status = 'completed' THEN g.key_word END,
+               g.current_round, g.board, g.created_at
+        FROM games g
+        LEFT JOIN clients cw ON cw.uuid = g.witness_uuid
+        LEFT JOIN clients cd ON cd.uuid = g.detective_uuid
+        LEFT JOIN models mw ON mw.id = cw.model_id
+        LEFT JOIN models md ON md.id = cd.model_id
+        ''',
+        'rowid': 'g.rowid',
+        'witness_model': 'mw.name',
+        'detective_model': 'md.name',
+        'time': 'g.created_at'
+    }
+}
+
+def open_read_only_db():
+    """Open a read-only connection that never takes write locks"""
+    return sqlite3.connect('file:hard_to_get.db?mode=ro', uri=True)
+
+def iter_export_rows(table, model=None, role=None, since=None, until=None,
+                     after=0, limit=None):
+    """
+    Yield rows of an export table in rowid order, one keyset page at a time
+    
+    Every page is a separate short read on a read-only connection, so a long
+    export neither holds a snapshot open nor blocks result writes, and only
+    one page is in memory at a time. The first column is the rowid, which
+    callers pass back as `after` to resume.
+    """
+    spec = EXPORT_TABLES[table]
+    
+    conditions = []
+    params = []
+    if model:
+        if role == 'Witness':
+            conditions.append(f"{spec['witness_model']} = ?")
+            params.append(model)
+        elif role == 'Detective':
+            conditions.append(f"{spec['detective_model']} = ?")
+            params.append(model)
+        else:
+            conditions.append(f"({spec['witness_model']} = ? OR {spec['detective_model']} = ?)")
+            params.extend([model, model])
+    if since:
+        conditions.append(f"{spec['time']} >= ?")
+        params.append(since)
+    if until:
+        conditions.append(f"{spec['time']} < ?")
+        params.append(until)
+    
+    where = ' AND '.join([f"{spec['rowid']} > ?"] + conditions)
+    query = f"{spec['query']} WHERE {where} ORDER BY {spec['rowid']} LIMIT ?"
+    
+    conn = open_read_only_db()
+    try:
+        remaining = limit
+        while remaining is None or remaining > 0:
+            page_size = EXPORT_PAGE_SIZE if remaining is None else min(EXPORT_PAGE_SIZE, remaining)
+            rows = conn.execute(query, [after] + params + [page_size]).fetchall()
+            
+            for row in rows:
+                yield row
+            
+            if len(rows) < page_size:
+                break
+            after = rows[-1][0]
+            if remaining is not None:
+                remaining -= len(rows)
+    finally:
+        conn.close()
+
+def format_ndjson(columns, rows):
+    for row in rows:
+        record = dict(zip(columns, row))
+        if record.get('board'):
+            record['board'] = json.loads(record['board'])
+        yield json.dumps(record) + '\n'
+
+def format_csv(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    
+    # Header only, for empty exports
+    if buffer.getvalue():
+        yield buffer.getvalue()
+
+# Client UUID -> model ID entries kept in memory; older ones are reloaded on demand
+SESSION_CACHE_SIZE = 10000
+
 # Game state management
 class GameManager:
     def __init__(self):
         self.lock = Lock()
         self.words = load_words()
         self.dilemmas = load_dilemmas()
+        self.matchmaker = Matchmaker()
+        self.spectators = SpectatorHub()
+        
+        # Model name -> model ID, and an LRU of client UUID -> model ID
+        self.model_ids = {}
+        self.sessions = OrderedDict()
+        self.session_lock = Lock()
         
         # Initialize the database
         init_db()
+        
+        # Seed matchmaking ratings from past results
+        conn = sqlite3.connect('hard_to_get.db')
+        cursor = conn.cursor()
+        self.matchmaker.load_results(cursor)
+        
+        # Put games still waiting for a second player back into the index
+        cursor.execute('''
+        SELECT g.id, g.witness_uuid, g.detective_uuid, c.model_id
+        FROM games g
+        JOIN clients c ON c.uuid = COALESCE(g.witness_uuid, g.detective_uuid)
+        WHERE g.status = 'pending'
+        ORDER BY g.rowid
+        ''')
+        for game_id, witness_uuid, detective_uuid, model_id in cursor.fetchall():
+            if witness_uuid:
+                self.matchmaker.add(game_id, 'Detective', witness_uuid, model_id)
+            else:
+                self.matchmaker.add(game_id, 'Witness', detective_uuid, model_id)
+        
+        conn.close()
     
-    def register_client(self, model_name):
-        """Register a new client and return its UUID"""
-        client_id = str(uuid.uuid4())
+    def get_model_id(self, cursor, model_name):
+        """Return the ID of a model, adding it to the models table if needed"""
+        model_id = self.model_ids.get(model_name)
+        if model_id is None:
+            cursor.execute('INSERT OR IGNORE INTO models (name) VALUES (?)', (model_name,))
+            cursor.execute('SELECT id FROM models WHERE name = ?', (model_name,))
+            model_id = self.model_ids[model_name] = cursor.fetchone()[0]
+        return model_id
+    
+    def cache_session(self, client_id, model_id):
+        """Remember a client's model ID, evicting the least recently used sessions"""
+        with self.session_lock:
+            self.sessions[client_id] = model_id
+            self.sessions.move_to_end(client_id)
+            while len(self.sessions) > SESSION_CACHE_SIZE:
+                self.sessions.popitem(last=False)
+    
+    def get_client_model_id(self, cursor, client_id):
+        """Return a client's model ID from the session cache, falling back to the database"""
+        with self.session_lock:
+            if client_id in self.sessions:
+                self.sessions.move_to_end(client_id)
+                return self.sessions[client_id]
         
+        cursor.execute('SELECT model_id FROM clients WHERE uuid = ?', (client_id,))
+        client_result = cursor.fetchone()
+        if not client_result:
+            return None
+        
+        self.cache_session(client_id, client_result[0])
+        return client_result[0]
+    
+    def register_client(self, model_name, client_id=None):
+        """
+        Register a client and return its UUID
+        
+        A known client_id registered with the same model is resumed instead
+        of creating a new client, unless that client is currently in a game.
+        """
         conn = sqlite3.connect('hard_to_get.db')
         cursor = conn.cursor()
-        cursor.execute('INSERT INTO clients (uuid, model_name) VALUES (?, ?)',
-                      (client_id, model_name))
+        model_id = self.get_model_id(cursor, model_name)
+        
+        if client_id:
+            cursor.execute('''
+            UPDATE clients SET status = 'available'
+            WHERE uuid = ? AND model_id = ? AND status != 'in_game'
+            ''', (client_id, model_id))
+            if cursor.rowcount == 1:
+                conn.commit()
+                conn.close()
+                self.cache_session(client_id, model_id)
+                return {'client_id': client_id, 'status': 'resumed'}
+            
+            # Never hand out a client that is playing right now
+            cursor.execute('''
+            SELECT 1 FROM clients WHERE uuid = ? AND model_id = ? AND status = 'in_game'
+            ''', (client_id, model_id))
+            if cursor.fetchone():
+                conn.close()
+                return {'error': 'Client is in a game and cannot be resumed'}
+        
+        client_id = str(uuid.uuid4())
+        cursor.execute('INSERT INTO clients (uuid, model_name, model_id) VALUES (?, ?, ?)',
+                      (client_id, model_name, model_id))
         conn.commit()
         conn.close()
         
-        return client_id
+        self.cache_session(client_id, model_id)
+        
+        return {'client_id': client_id, 'status': 'registered'}
     
-    def create_or_join_game(self, client_id, preferred_role=None):
+    def create_or_join_game(self, client_id, preferred_role=None, matchmaking=None):
         """Create a new game or join an existing one"""
         with self.lock:
             conn = sqlite3.connect('hard_to_get.db')
@@ -163,10 +740,30 @@ class GameManager:
             cursor.execute('UPDATE clients SET status = ? WHERE uuid = ?',
                           ('searching', client_id))
             
+            model_id = self.get_client_model_id(cursor, client_id)
+            
             # Check if there's a pending game that needs this role
             available_game = None
+            new_game = False
+            
+            if matchmaking == 'rated':
+                # Pair by model rating and pair coverage instead of arrival order
+                while not available_game:
+                    game_id, role = self.matchmaker.claim(client_id, model_id, preferred_role)
+                    if not game_id:
+                        break
+                    
+                    column = 'witness_uuid' if role == 'Witness' else 'detective_uuid'
+                    cursor.execute(f'''
+                    UPDATE games SET {column} = ?
+                    WHERE id = ? AND {column} IS NULL AND status = 'pending'
+                    ''', (client_id, game_id))
+                    
+                    # Skip index entries that went stale behind our back
+                    if cursor.rowcount == 1:
+                        available_game = game_id
             
-            if preferred_role == 'Detective':
+            elif preferred_role == 'Detective':
                 # Look for a game with a Witness but no Detective
                 cursor.execute('''
                 SELECT id FROM games 
@@ -182,6 +779,7 @@ class GameManager:
                     UPDATE games SET detective_uuid = ? WHERE id = ?
                     ''', (client_id, game_id))
                     available_game = game_id
+                    self.matchmaker.discard(game_id)
             
             elif preferred_role == 'Witness':
                 # Look for a game with a Detective but no Witness
@@ -199,6 +797,7 @@ class GameManager:
                     UPDATE games SET witness_uuid = ? WHERE id = ?
                     ''', (client_id, game_id))
                     available_game = game_id
+                    self.matchmaker.discard(game_id)
             
             else:
                 # Random role assignment - check if there's any incomplete game
@@ -223,6 +822,8 @@ class GameManager:
                         UPDATE games SET detective_uuid = ? WHERE id = ?
                         ''', (client_id, game_id))
                         available_game = game_id
+                    
+                    self.matchmaker.discard(game_id)
             
             # If no suitable game found, create a new one
             if not available_game:
@@ -234,28 +835,29 @@ class GameManager:
                 
                 if preferred_role == 'Witness':
                     cursor.execute('''
-                    INSERT INTO games (id, witness_uuid, board)
-                    VALUES (?, ?, ?)
+                    INSERT INTO games (id, witness_uuid, board, created_at)
+                    VALUES (?, ?, ?, datetime('now'))
                     ''', (game_id, client_id, board_json))
                 elif preferred_role == 'Detective':
                     cursor.execute('''
-                    INSERT INTO games (id, detective_uuid, board)
-                    VALUES (?, ?, ?)
+                    INSERT INTO games (id, detective_uuid, board, created_at)
+                    VALUES (?, ?, ?, datetime('now'))
                     ''', (game_id, client_id, board_json))
                 else:
                     # Randomly assign as witness or detective for the new game
                     if random.choice([True, False]):
                         cursor.execute('''
-                        INSERT INTO games (id, witness_uuid, board)
-                        VALUES (?, ?, ?)
+                        INSERT INTO games (id, witness_uuid, board, created_at)
+                        VALUES (?, ?, ?, datetime('now'))
                         ''', (game_id, client_id, board_json))
                     else:
                         cursor.execute('''
-                        INSERT INTO games (id, detective_uuid, board)
-                        VALUES (?, ?, ?)
+                        INSERT INTO games (id, detective_uuid, board, created_at)
+                        VALUES (?, ?, ?, datetime('now'))
                         ''', (game_id, client_id, board_json))
                 
                 available_game = game_id
+                new_game = True
             
             # Update client status
             cursor.execute('UPDATE clients SET status = ? WHERE uuid = ?',
@@ -273,6 +875,13 @@ class GameManager:
                 UPDATE games SET status = 'ready' WHERE id = ?
                 ''', (available_game,))
                 game_ready = True
+                
+                # Count the pairing now, so coverage reflects games in progress
+                self.matchmaker.start_game(
+                    available_game,
+                    self.get_client_model_id(cursor, game_roles[0]),
+                    self.get_client_model_id(cursor, game_roles[1])
+                )
             
             conn.commit()
             
@@ -294,6 +903,11 @@ class GameManager:
             
             conn.close()
             
+            # Make the new game visible to rated matchmaking
+            if new_game:
+                open_role = 'Detective' if assigned_role == 'Witness' else 'Witness'
+                self.matchmaker.add(available_game, open_role, client_id, model_id)
+            
             response = {
                 'game_id': available_game,
                 'role': assigned_role,
@@ -301,6 +915,10 @@ class GameManager:
                 'board': board
             }
             
+            self.spectators.publish(available_game, 'player_joined', {
+                'status': 'ready' if game_ready else 'pending'
+            })
+            
             # If game is ready, initiate the first round for the Witness
             if game_ready:
                 self.start_game(available_game)
@@ -337,6 +955,11 @@ class GameManager:
         
         # Notify players that the game has started
         socketio.emit('game_started', {'game_id': game_id}, room=game_id)
+        self.spectators.publish(game_id, 'game_started', {
+            'status': 'active',
+            'round': 1,
+            'board': board
+        })
         
         # Send the key word to the witness
         self.send_witness_key_word(game_id, witness_uuid, key_word)
@@ -354,6 +977,9 @@ class GameManager:
         }
         
         socketio.emit('witness_turn', payload, room=witness_uuid)
+        
+        # Spectators never see the key word of a running game
+        self.spectators.publish(game_id, 'witness_turn', {'round': 1, 'dilemma': dilemma})
     
     def witness_response(self, game_id, client_id, dilemma_choice):
         """Process witness's dilemma choice and notify detective"""
@@ -388,6 +1014,11 @@ class GameManager:
         
         # Notify detective it's their turn
         socketio.emit('detective_turn', detective_payload, room=detective_uuid)
+        self.spectators.publish(game_id, 'detective_turn', {
+            'round': current_round,
+            'dilemma': dilemma,
+            'witness_choice': dilemma_choice
+        })
         
         return {'status': 'success'}
     
@@ -442,7 +1073,12 @@ class GameManager:
             ''', ('completed', json.dumps(updated_board), game_id))
             
             # Record the result
-            self.save_game_result(cursor, game_id, win)
+            self.save_game_result(cursor, game_id, win, witness_uuid, client_id)
+            
+            # Both players are free again
+            cursor.execute('''
+            UPDATE clients SET status = 'available' WHERE uuid IN (?, ?)
+            ''', (witness_uuid, client_id))
         else:
             # Move to next round
             cursor.execute('''
@@ -463,7 +1099,19 @@ class GameManager:
                 'final_board': updated_board
             }
             socketio.emit('game_ended', end_payload, room=game_id)
+            self.spectators.publish(game_id, 'game_ended', {
+                'status': 'completed',
+                'win': win,
+                'key_word': key_word,
+                'board': updated_board
+            })
         else:
+            self.spectators.publish(game_id, 'detective_choice', {
+                'round': current_round,
+                'eliminated': eliminated_words,
+                'board': updated_board
+            })
+            
             # Notify witness for the next round
             self.start_next_round(game_id, witness_uuid, key_word, current_round + 1)
         
@@ -489,27 +1137,24 @@ class GameManager:
         }
         
         socketio.emit('witness_turn', payload, room=witness_uuid)
+        self.spectators.publish(game_id, 'witness_turn', {'round': next_round, 'dilemma': dilemma})
     
-    def save_game_result(self, cursor, game_id, win):
+    def save_game_result(self, cursor, game_id, win, witness_uuid, detective_uuid):
         """Save the game result to the database"""
-        # Get player information
-        cursor.execute('''
-        SELECT g.witness_uuid, c1.model_name, g.detective_uuid, c2.model_name
-        FROM games g
-        JOIN clients c1 ON g.witness_uuid = c1.uuid
-        JOIN clients c2 ON g.detective_uuid = c2.uuid
-        WHERE g.id = ?
-        ''', (game_id,))
-        
-        witness_uuid, witness_model, detective_uuid, detective_model = cursor.fetchone()
+        # Model IDs come from the session cache, so no join is needed
+        witness_model_id = self.get_client_model_id(cursor, witness_uuid)
+        detective_model_id = self.get_client_model_id(cursor, detective_uuid)
         
         # Insert into results table
         cursor.execute('''
         INSERT INTO results 
-        (game_id, witness_uuid, witness_model, detective_uuid, detective_model, result)
-        VALUES (?, ?, ?, ?, ?, ?)
-        ''', (game_id, witness_uuid, witness_model, detective_uuid, detective_model, 
+        (game_id, witness_uuid, witness_model_id, detective_uuid, detective_model_id, result,
+         completed_at)
+        VALUES (?, ?, ?, ?, ?, ?, datetime('now'))
+        ''', (game_id, witness_uuid, witness_model_id, detective_uuid, detective_model_id, 
               'win' if win else 'loss'))
+        
+        self.matchmaker.record_result(game_id, witness_model_id, detective_model_id, win)
 
 # Initialize game manager
 game_manager = GameManager()
@@ -519,24 +1164,29 @@ game_manager = GameManager()
 def register_client():
     data = request.json
     model_name = data.get('model_name', 'unknown')
+    client_id = data.get('client_id')  # Previous client ID to resume, if any
+    
+    result = game_manager.register_client(model_name, client_id)
     
-    client_id = game_manager.register_client(model_name)
+    if 'error' in result:
+        return jsonify(result), 409
     
-    return jsonify({
-        'client_id': client_id,
-        'status': 'registered'
-    })
+    return jsonify(result)
 
 @app.route('/join_game', methods=['POST'])
 def join_game():
     data = request.json
     client_id = data.get('client_id')
     preferred_role = data.get('preferred_role')  # 'Witness', 'Detective', or None for random
+    matchmaking = data.get('matchmaking')  # 'rated' or None for first available game
     
     if not client_id:
         return jsonify({'error': 'Client ID is required'}), 400
     
-    game_info = game_manager.create_or_join_game(client_id, preferred_role)
+    if matchmaking not in (None, 'rated'):
+        return jsonify({'error': 'Unknown matchmaking mode'}), 400
+    
+    game_info = game_manager.create_or_join_game(client_id, preferred_role, matchmaking)
     
     return jsonify(game_info)
 
@@ -568,6 +1218,58 @@ def detective_choice():
     
     return jsonify(result)
 
+@app.route('/spectate', methods=['GET'])
+@app.route('/spectate/<game_id>', methods=['GET'])
+def spectate(game_id=None):
+    """Stream coalesced game updates as Server-Sent Events"""
+    subscriber = game_manager.spectators.subscribe(game_id)
+    
+    return Response(
+        stream_with_context(game_manager.spectators.stream(subscriber)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/export/<table>', methods=['GET'])
+def export_table(table):
+    """Stream the results or games table as NDJSON or CSV"""
+    if table not in EXPORT_TABLES:
+        return jsonify({'error': 'Unknown table'}), 404
+    
+    export_format = request.args.get('format', 'ndjson')
+    role = request.args.get('role')
+    
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({'error': 'Unknown format'}), 400
+    
+    if role not in (None, 'Witness', 'Detective'):
+        return jsonify({'error': 'Unknown role'}), 400
+    
+    try:
+        after = int(request.args.get('cursor', 0))
+        limit = request.args.get('limit')
+        limit = int(limit) if limit is not None else None
+    except ValueError:
+        return jsonify({'error': 'cursor and limit must be integers'}), 400
+    
+    rows = iter_export_rows(
+        table,
+        model=request.args.get('model'),
+        role=role,
+        since=request.args.get('since'),
+        until=request.args.get('until'),
+        after=after,
+        limit=limit
+    )
+    
+    columns = EXPORT_TABLES[table]['columns']
+    if export_format == 'csv':
+        body, mimetype = format_csv(columns, rows), 'text/csv'
+    else:
+        body, mimetype = format_ndjson(columns, rows), 'application/x-ndjson'
+    
+    return Response(stream_with_context(body), mimetype=mimetype)
+
 # Socket.IO events
 @socketio.on('connect')
 def handle_connect():
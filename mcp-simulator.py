@@ -0,0 +1,260 @@
+import os
+import sys
+import json
+import math
+import random
+import argparse
+import hashlib
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Game rules, mirroring GameManager.detective_response
+BOARD_SIZE = 16
+MAX_ROUNDS = 5
+
+# Load the client's placeholder strategies from mcp-client.py
+_client_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mcp-client.py')
+_spec = importlib.util.spec_from_file_location('mcp_client', _client_path)
+mcp_client = importlib.util.module_from_spec(_spec)
+sys.modules['mcp_client'] = mcp_client
+_spec.loader.exec_module(mcp_client)
+
+# Catalog loaded once per worker process by init_worker
+WORDS = []
+DILEMMAS = []
+
+def load_catalog(words_path, dilemmas_path):
+    """Load words and dilemmas in the same format the server reads"""
+    with open(words_path, 'r') as f:
+        words = [line.strip() for line in f if line.strip()]
+    with open(dilemmas_path, 'r') as f:
+        dilemmas = [line.strip().split(',') for line in f if line.strip()]
+    return words, dilemmas
+
+def init_worker(words_path, dilemmas_path):
+    global WORDS, DILEMMAS
+    WORDS, DILEMMAS = load_catalog(words_path, dilemmas_path)
+
+# Witness strategies: (key_word, dilemma, rng) -> index of the chosen side
+def hash_witness(key_word, dilemma, rng):
+    """The client's placeholder Witness"""
+    return mcp_client.hash_dilemma_side(key_word, dilemma)
+
+def random_witness(key_word, dilemma, rng):
+    """Picks a side at random, i.e. gives no information"""
+    return rng.randint(0, 1)
+
+WITNESS_STRATEGIES = {
+    'hash': hash_witness,
+    'random': random_witness,
+}
+
+# Witness strategies whose choice depends only on the key word and dilemma
+DETERMINISTIC_WITNESSES = {'hash'}
+
+# Detective strategies: (board, dilemma, witness_choice, witness, rng) -> words to eliminate
+def similarity_detective(board, dilemma, witness_choice, witness, rng):
+    """The client's placeholder Detective"""
+    num_to_eliminate = min(len(board) - 1, rng.randint(1, 3))
+    return mcp_client.rank_eliminations(board, dilemma, witness_choice)[:num_to_eliminate]
+
+def random_detective(board, dilemma, witness_choice, witness, rng):
+    """Eliminates 1-3 random words"""
+    return rng.sample(board, min(len(board) - 1, rng.randint(1, 3)))
+
+def oracle_detective(board, dilemma, witness_choice, witness, rng):
+    """
+    Knows the Witness strategy (but not the key word) and eliminates every word
+    for which the Witness would have chosen the other side. Against a
+    deterministic Witness this is the best any Detective can do.
+    """
+    eliminated = [word for word in board
+                  if dilemma[witness(word, dilemma, rng)] != witness_choice]
+
+    # A turn must eliminate something; guess when the clue rules nothing out
+    if not eliminated:
+        eliminated = [rng.choice(board)]
+
+    return eliminated
+
+DETECTIVE_STRATEGIES = {
+    'similarity': similarity_detective,
+    'random': random_detective,
+    'oracle': oracle_detective,
+}
+
+def play_game(witness, detective, rng):
+    """Play one game, returning (win, rounds played)"""
+    board = rng.sample(WORDS, BOARD_SIZE)
+    key_word = rng.choice(board)
+
+    for current_round in range(1, MAX_ROUNDS + 1):
+        dilemma = rng.choice(DILEMMAS)
+        witness_choice = dilemma[witness(key_word, dilemma, rng)]
+        eliminated = detective(board, dilemma, witness_choice, witness, rng)
+
+        if key_word in eliminated:
+            return False, current_round
+
+        board = [word for word in board if word not in eliminated]
+        if len(board) == 1:
+            return True, current_round
+
+    return False, MAX_ROUNDS
+
+def chunk_seed(base_seed, witness_name, detective_name, chunk_start):
+    """
+    Seed for one chunk, derived from the pair names so a pair samples the same
+    games however --pairs is ordered (str hashes differ between processes)
+    """
+    key = f"{base_seed}:{witness_name}:{detective_name}:{chunk_start}".encode()
+    return int.from_bytes(hashlib.sha256(key).digest()[:4], 'big')
+
+def run_chunk(witness_name, detective_name, games, seed):
+    """Play a chunk of games in a worker process and return its tallies"""
+    rng = random.Random(seed)
+    witness = WITNESS_STRATEGIES[witness_name]
+    detective = DETECTIVE_STRATEGIES[detective_name]
+
+    wins = 0
+    win_rounds = [0] * (MAX_ROUNDS + 1)
+    for _ in range(games):
+        win, rounds = play_game(witness, detective, rng)
+        if win:
+            wins += 1
+            win_rounds[rounds] += 1
+
+    return witness_name, detective_name, wins, games, win_rounds
+
+def wilson_interval(wins, games, z=1.96):
+    """Wilson score confidence interval for a win rate"""
+    if games == 0:
+        return 0.0, 1.0
+
+    p = wins / games
+    denominator = 1 + z * z / games
+    centre = (p + z * z / (2 * games)) / denominator
+    half_width = z * math.sqrt(p * (1 - p) / games + z * z / (4 * games * games)) / denominator
+    return max(0.0, centre - half_width), min(1.0, centre + half_width)
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+def summarize(tally):
+    """Turn the accumulated tallies of one strategy pair into a report"""
+    wins, games = tally['wins'], tally['games']
+    low, high = wilson_interval(wins, games)
+    chunk_rates = sorted(tally['chunk_rates'])
+
+    return {
+        'witness': tally['witness'],
+        'detective': tally['detective'],
+        'games': games,
+        'wins': wins,
+        'win_rate': wins / games if games else 0.0,
+        'ci95': [low, high],
+        'chunk_win_rates': {
+            'min': chunk_rates[0],
+            'p10': percentile(chunk_rates, 0.1),
+            'median': percentile(chunk_rates, 0.5),
+            'p90': percentile(chunk_rates, 0.9),
+            'max': chunk_rates[-1],
+        },
+        'wins_by_round': {str(r): tally['win_rounds'][r] for r in range(1, MAX_ROUNDS + 1)},
+    }
+
+def positive_int(value):
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a positive integer, got {value!r}")
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"expected a positive integer, got {value!r}")
+    return number
+
+def parse_pair(value):
+    witness, _, detective = value.partition(':')
+    if witness not in WITNESS_STRATEGIES or detective not in DETECTIVE_STRATEGIES:
+        raise argparse.ArgumentTypeError(
+            f"expected WITNESS:DETECTIVE with WITNESS in {sorted(WITNESS_STRATEGIES)} "
+            f"and DETECTIVE in {sorted(DETECTIVE_STRATEGIES)}")
+    if detective == 'oracle' and witness not in DETERMINISTIC_WITNESSES:
+        raise argparse.ArgumentTypeError("the oracle Detective needs a deterministic Witness")
+    return witness, detective
+
+def default_pairs():
+    return [(witness, detective)
+            for witness in WITNESS_STRATEGIES
+            for detective in DETECTIVE_STRATEGIES
+            if detective != 'oracle' or witness in DETERMINISTIC_WITNESSES]
+
+def default_catalog_path(name, shipped):
+    """Prefer the file the server uses, falling back to the catalog shipped with the repo"""
+    return name if os.path.exists(name) or not os.path.exists(shipped) else shipped
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Monte Carlo estimate of Hard to Get win rates for strategy pairs")
+    parser.add_argument('--pairs', nargs='+', type=parse_pair, default=None,
+                        help="strategy pairs as WITNESS:DETECTIVE (default: all)")
+    parser.add_argument('--games', type=positive_int, default=10000, help="games per pair")
+    parser.add_argument('--chunk-size', type=positive_int, default=500, help="games per worker task")
+    parser.add_argument('--workers', type=positive_int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument('--seed', type=int, default=0, help="base random seed")
+    parser.add_argument('--words', default=default_catalog_path('words.txt', 'words-txt.txt'))
+    parser.add_argument('--dilemmas', default=default_catalog_path('dilemmas.txt', 'dilemmas-txt.txt'))
+    parser.add_argument('--json', action='store_true', help="print the final report as JSON")
+    args = parser.parse_args()
+
+    for path in (args.words, args.dilemmas):
+        if not os.path.exists(path):
+            parser.error(f"catalog file not found: {path}")
+
+    # Each pair is simulated once, in the order first given
+    pairs = list(dict.fromkeys(args.pairs)) if args.pairs else default_pairs()
+    tallies = {
+        pair: {'witness': pair[0], 'detective': pair[1], 'wins': 0, 'games': 0,
+               'chunk_rates': [], 'win_rounds': [0] * (MAX_ROUNDS + 1)}
+        for pair in pairs
+    }
+
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                             initargs=(args.words, args.dilemmas)) as pool:
+        futures = []
+        for witness, detective in pairs:
+            for chunk_start in range(0, args.games, args.chunk_size):
+                games = min(args.chunk_size, args.games - chunk_start)
+                seed = chunk_seed(args.seed, witness, detective, chunk_start)
+                futures.append(pool.submit(run_chunk, witness, detective, games, seed))
+
+        # Stream partial results as chunks finish
+        for future in as_completed(futures):
+            witness, detective, wins, games, win_rounds = future.result()
+            tally = tallies[(witness, detective)]
+            tally['wins'] += wins
+            tally['games'] += games
+            tally['chunk_rates'].append(wins / games)
+            for r in range(1, MAX_ROUNDS + 1):
+                tally['win_rounds'][r] += win_rounds[r]
+
+            low, high = wilson_interval(tally['wins'], tally['games'])
+            print(f"{witness}:{detective} {tally['games']}/{args.games} games "
+                  f"win rate {tally['wins'] / tally['games']:.3f} [{low:.3f}, {high:.3f}]",
+                  file=sys.stderr, flush=True)
+
+    report = [summarize(tallies[pair]) for pair in pairs]
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"\n{'Witness':<10} {'Detective':<12} {'Games':>8} {'Win rate':>9} {'95% CI':>17} {'Chunk p10-p90':>15}")
+    for row in report:
+        rates = row['chunk_win_rates']
+        print(f"{row['witness']:<10} {row['detective']:<12} {row['games']:>8} "
+              f"{row['win_rate']:>9.3f} [{row['ci95'][0]:.3f}, {row['ci95'][1]:.3f}] "
+              f"{rates['p10']:>7.3f}-{rates['p90']:.3f}")
+
+if __name__ == '__main__':
+    main()